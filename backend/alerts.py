@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+
+
+# kind -> (prices column it watches, direction it fires on)
+ALERT_KINDS = {
+    "price_above": ("current_price", "up"),
+    "price_below": ("current_price", "down"),
+    "change_above": ("price_change_percentage_24h", "up"),
+    "change_below": ("price_change_percentage_24h", "down"),
+}
+
+
+class AlertIndex:
+    """Per coin and alert kind, thresholds kept sorted so a price move only touches the alerts it crosses."""
+
+    def __init__(self):
+        self._thresholds = {}
+        self._alert_ids = {}
+        self.size = 0
+
+    @classmethod
+    def from_alerts(cls, alerts):
+        # alerts: iterable of (alert_id, coin_id, kind, threshold)
+        grouped = {}
+        for alert_id, coin_id, kind, threshold in alerts:
+            grouped.setdefault((coin_id, kind), []).append((float(threshold), alert_id))
+
+        index = cls()
+        for key, entries in grouped.items():
+            entries.sort()
+            index._thresholds[key] = [threshold for threshold, _ in entries]
+            index._alert_ids[key] = [alert_id for _, alert_id in entries]
+            index.size += len(entries)
+        return index
+
+    def add(self, alert_id, coin_id, kind, threshold):
+        key = (coin_id, kind)
+        thresholds = self._thresholds.setdefault(key, [])
+        alert_ids = self._alert_ids.setdefault(key, [])
+        i = bisect_right(thresholds, float(threshold))
+        thresholds.insert(i, float(threshold))
+        alert_ids.insert(i, alert_id)
+        self.size += 1
+
+    def evaluate(self, coin_id, kind, old, new):
+        """Return the ids of alerts whose threshold lies between old and new, leaving them in the index."""
+        key = (coin_id, kind)
+        thresholds = self._thresholds.get(key)
+        if not thresholds or old is None or new is None:
+            return []
+
+        old, new = float(old), float(new)
+        if ALERT_KINDS[kind][1] == "up":
+            # old < threshold <= new
+            lo, hi = bisect_right(thresholds, old), bisect_right(thresholds, new)
+        else:
+            # new <= threshold < old
+            lo, hi = bisect_left(thresholds, new), bisect_left(thresholds, old)
+        if lo >= hi:
+            return []
+        return self._alert_ids[key][lo:hi]
+
+    def evaluate_coin(self, coin_id, old_values, new_values):
+        """old_values/new_values map prices columns to values; returns [(alert_id, coin_id, kind)]."""
+        triggered = []
+        for kind, (column, _) in ALERT_KINDS.items():
+            for alert_id in self.evaluate(coin_id, kind, old_values.get(column), new_values.get(column)):
+                triggered.append((alert_id, coin_id, kind))
+        return triggered
+
+    def discard(self, triggered):
+        """Drop alerts returned by evaluate_coin once their notifications are committed."""
+        for alert_id, coin_id, kind in triggered:
+            alert_ids = self._alert_ids.get((coin_id, kind))
+            if alert_ids and alert_id in alert_ids:
+                i = alert_ids.index(alert_id)
+                del alert_ids[i]
+                del self._thresholds[(coin_id, kind)][i]
+                self.size -= 1
+
+
+def condition_met(kind, threshold, values):
+    """Whether a prices row (mapping of columns to values) already satisfies an alert."""
+    column, direction = ALERT_KINDS[kind]
+    value = values.get(column)
+    if value is None:
+        return False
+    if direction == "up":
+        return float(value) >= float(threshold)
+    return float(value) <= float(threshold)
+
+
+def queue_alert_notifications(cursor, alert_ids):
+    if not alert_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(alert_ids))
+
+    # Notifications snapshot the price the alert fired at, the queue is drained by the API
+    cursor.execute(f"""
+        INSERT INTO alert_notifications (alert_id, user_id, coin_id, kind, threshold, current_price, price_change_percentage_24h)
+        SELECT a.alert_id, a.user_id, a.coin_id, a.kind, a.threshold, p.current_price, p.price_change_percentage_24h
+        FROM alerts a
+        JOIN prices p ON a.coin_id = p.id
+        WHERE a.alert_id IN ({placeholders}) AND a.active = TRUE
+    """, list(alert_ids))
+    cursor.execute(
+        f"UPDATE alerts SET active = FALSE, triggered_at = NOW() WHERE alert_id IN ({placeholders}) AND active = TRUE",
+        list(alert_ids)
+    )
+    print(f"{len(alert_ids)} alerts triggered.")
@@ -0,0 +1,258 @@
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+import os, shutil
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# Optional DuckDB copy of hist/ohlc for long range and cross-coin queries.
+# Enabled when ANALYTICS_DB_PATH is set and duckdb is installed.
+# DuckDB allows many readers or one writer per file, never both, so the
+# ingester writes a private build file and publish() swaps a copy of it
+# into ANALYTICS_DB_PATH, the same way snapshot.py publishes snapshots.
+load_dotenv()
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH")
+ANALYTICS_BUILD_PATH = f"{ANALYTICS_DB_PATH}.build"
+
+TABLES = {
+    "hist": ("id", ("id", "timestamp", "usd", "usd_market_cap", "volume")),
+    "ohlc": ("coin_id", ("coin_id", "timestamp", "open", "high", "low", "close")),
+}
+
+# Value column and its MySQL scale, summed per coin so updated rows show up as drift
+CHECKSUM_COLUMNS = {
+    "hist": ("usd", 3),
+    "ohlc": ("close", 8),
+}
+
+ROLLUP_INTERVALS = ("day", "week", "month")
+
+
+def analytics_enabled():
+    return duckdb is not None and bool(ANALYTICS_DB_PATH)
+
+
+def try_read(query, *args):
+    """Run an analytics read, or return None so the caller falls back to MySQL."""
+    if not analytics_enabled():
+        return None
+    try:
+        return query(*args)
+    except duckdb.Error as e:
+        print(f"Analytics store unavailable: {e}")
+        return None
+
+
+def _connect():
+    # API readers only ever open the published file, which nothing writes to
+    return duckdb.connect(ANALYTICS_DB_PATH, read_only=True)
+
+
+def _connect_build():
+    conn = duckdb.connect(ANALYTICS_BUILD_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS hist (
+        id VARCHAR NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        usd DOUBLE NOT NULL,
+        usd_market_cap BIGINT NOT NULL,
+        volume BIGINT NOT NULL,
+        PRIMARY KEY (id, timestamp))
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ohlc (
+        coin_id VARCHAR NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        open DOUBLE NOT NULL,
+        high DOUBLE NOT NULL,
+        low DOUBLE NOT NULL,
+        close DOUBLE NOT NULL,
+        PRIMARY KEY (coin_id, timestamp))
+    """)
+    return conn
+
+
+def _utc_naive(timestamp):
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _cutoff(days):
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+def _fetch_dicts(conn, query, params):
+    cursor = conn.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _hist_values(rows):
+    return [(coin_id, _utc_naive(timestamp), float(usd), int(market_cap), int(volume)) for coin_id, timestamp, usd, market_cap, volume in rows]
+
+
+def _ohlc_values(rows):
+    return [(coin_id, _utc_naive(timestamp), *(float(price) for price in prices)) for coin_id, timestamp, *prices in rows]
+
+
+def save_hist(rows):
+    # rows: (id, timestamp, usd, usd_market_cap, volume)
+    conn = _connect_build()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO hist VALUES (?, ?, ?, ?, ?)",
+            _hist_values(rows)
+        )
+    finally:
+        conn.close()
+
+
+def save_ohlc(rows):
+    # rows: (coin_id, timestamp, open, high, low, close)
+    conn = _connect_build()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ohlc VALUES (?, ?, ?, ?, ?, ?)",
+            _ohlc_values(rows)
+        )
+    finally:
+        conn.close()
+
+
+def coverage(table):
+    """(max timestamp, row count, value checksum) per coin in the build file, to compare against MySQL."""
+    key, _ = TABLES[table]
+    column, scale = CHECKSUM_COLUMNS[table]
+    conn = _connect_build()
+    try:
+        # Cast back to the MySQL DECIMAL scale so the sum matches MySQL's exactly
+        rows = conn.execute(
+            f"SELECT {key}, max(timestamp), count(*), sum(CAST({column} AS DECIMAL(38, {scale}))) FROM {table} GROUP BY {key}"
+        ).fetchall()
+        return {coin_id: (max_timestamp, count, checksum) for coin_id, max_timestamp, count, checksum in rows}
+    finally:
+        conn.close()
+
+
+def replace_coin_rows(table, coin_id, rows):
+    """Overwrite one coin's rows in the build file, used to backfill writes that were missed."""
+    key, columns = TABLES[table]
+    values = _hist_values(rows) if table == "hist" else _ohlc_values(rows)
+    conn = _connect_build()
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (coin_id,))
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(columns))})", values)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def publish():
+    # Fold the WAL into the build file, then swap a copy in so readers never see a partial file
+    conn = _connect_build()
+    try:
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+    tmp_path = f"{ANALYTICS_DB_PATH}.{os.getpid()}.tmp"
+    shutil.copyfile(ANALYTICS_BUILD_PATH, tmp_path)
+    os.replace(tmp_path, ANALYTICS_DB_PATH)
+
+
+def get_historical_prices(coin_id, days):
+    conn = _connect()
+    try:
+        return _fetch_dicts(conn, """
+            SELECT id, timestamp, usd, usd_market_cap, volume
+            FROM hist
+            WHERE id = ? AND timestamp >= ?
+            ORDER BY timestamp ASC
+        """, (coin_id, _cutoff(days)))
+    finally:
+        conn.close()
+
+
+def get_ohlc(coin_id, days):
+    conn = _connect()
+    try:
+        return _fetch_dicts(conn, """
+            SELECT coin_id, timestamp, open, high, low, close
+            FROM ohlc
+            WHERE coin_id = ? AND timestamp >= ?
+            ORDER BY timestamp ASC
+        """, (coin_id, _cutoff(days)))
+    finally:
+        conn.close()
+
+
+def get_rollup(coin_id, days, interval):
+    if interval not in ROLLUP_INTERVALS:
+        raise ValueError(f"Unknown rollup interval {interval}")
+    conn = _connect()
+    try:
+        return _fetch_dicts(conn, f"""
+            SELECT date_trunc('{interval}', timestamp) AS period,
+            arg_min(usd, timestamp) AS open,
+            max(usd) AS high,
+            min(usd) AS low,
+            arg_max(usd, timestamp) AS close,
+            avg(usd) AS avg_price,
+            avg(volume) AS avg_volume
+            FROM hist
+            WHERE id = ? AND timestamp >= ?
+            GROUP BY period
+            ORDER BY period ASC
+        """, (coin_id, _cutoff(days)))
+    finally:
+        conn.close()
+
+
+def get_performance(days, limit):
+    conn = _connect()
+    try:
+        return _fetch_dicts(conn, """
+            SELECT id,
+            arg_min(usd, timestamp) AS start_price,
+            arg_max(usd, timestamp) AS end_price,
+            (arg_max(usd, timestamp) / arg_min(usd, timestamp) - 1) * 100 AS change_percentage
+            FROM hist
+            WHERE timestamp >= ?
+            GROUP BY id
+            ORDER BY change_percentage DESC
+            LIMIT ?
+        """, (_cutoff(days), limit))
+    finally:
+        conn.close()
+
+
+def rollup_rows(rows, interval):
+    """Same buckets as get_rollup, computed in Python from hist rows ordered by timestamp."""
+    buckets = {}
+    for row in rows:
+        timestamp = row["timestamp"]
+        if interval == "day":
+            period = datetime(timestamp.year, timestamp.month, timestamp.day)
+        elif interval == "week":
+            period = datetime(timestamp.year, timestamp.month, timestamp.day) - timedelta(days=timestamp.weekday())
+        else:
+            period = datetime(timestamp.year, timestamp.month, 1)
+        buckets.setdefault(period, []).append(row)
+
+    result = []
+    for period, bucket in buckets.items():
+        prices = [float(row["usd"]) for row in bucket]
+        result.append({
+            "period": period,
+            "open": prices[0],
+            "high": max(prices),
+            "low": min(prices),
+            "close": prices[-1],
+            "avg_price": sum(prices) / len(prices),
+            "avg_volume": sum(row["volume"] for row in bucket) / len(bucket),
+        })
+    return result
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
-from jose import jwt
+from jose import jwt, JWTError
 import bcrypt, os
 
 load_dotenv()
@@ -25,3 +25,16 @@ def create_access_token(data: dict, expires_in: int = 60):
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_in)
     to_encode["exp"] = expire
     return jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
+
+
+def create_write_token(user_id: int, expires_in_seconds: float):
+    expire = datetime.now(timezone.utc) + timedelta(seconds=expires_in_seconds)
+    return jwt.encode({"user_id": user_id, "scope": "read_after_write", "exp": expire}, SECRET_KEY, algorithm="HS256")
+
+
+def verify_write_token(token: str, user_id: int):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except JWTError:
+        return False
+    return payload.get("scope") == "read_after_write" and payload.get("user_id") == user_id
@@ -0,0 +1,61 @@
+import random, time
+from alerts import AlertIndex, ALERT_KINDS
+
+
+# Compares AlertIndex against scanning every alert for one ingest batch.
+COINS = 1000
+BATCH = 250
+
+
+def make_alerts(count):
+    kinds = list(ALERT_KINDS)
+    return [
+        (alert_id, f"coin-{random.randrange(COINS)}", random.choice(kinds), random.uniform(0, 200))
+        for alert_id in range(count)
+    ]
+
+
+def make_batch():
+    batch = []
+    for coin in random.sample(range(COINS), BATCH):
+        old_price, old_change = random.uniform(0, 200), random.uniform(-20, 20)
+        batch.append((
+            f"coin-{coin}",
+            {"current_price": old_price, "price_change_percentage_24h": old_change},
+            {"current_price": old_price * random.uniform(0.99, 1.01), "price_change_percentage_24h": old_change + random.uniform(-0.5, 0.5)},
+        ))
+    return batch
+
+
+def scan(alerts, batch):
+    moves = {coin_id: (old, new) for coin_id, old, new in batch}
+    triggered = 0
+    for _, coin_id, kind, threshold in alerts:
+        if coin_id not in moves:
+            continue
+        old, new = moves[coin_id]
+        column, direction = ALERT_KINDS[kind]
+        if direction == "up" and old[column] < threshold <= new[column]:
+            triggered += 1
+        elif direction == "down" and new[column] <= threshold < old[column]:
+            triggered += 1
+    return triggered
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    for count in (10_000, 100_000, 1_000_000):
+        alerts = make_alerts(count)
+        batch = make_batch()
+        index = AlertIndex.from_alerts(alerts)
+
+        start = time.perf_counter()
+        indexed = sum(len(index.evaluate_coin(coin_id, old, new)) for coin_id, old, new in batch)
+        indexed_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scanned = scan(alerts, batch)
+        scan_time = time.perf_counter() - start
+
+        print(f"{count:>9} alerts: index {indexed_time * 1000:8.2f}ms ({indexed} triggered), "
+              f"scan {scan_time * 1000:8.2f}ms ({scanned} triggered)")
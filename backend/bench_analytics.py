@@ -0,0 +1,62 @@
+import time
+import analytics
+from db import get_read_connection
+
+
+# Compares MySQL and the analytics store on the same hist data.
+# Needs a populated hist table and ANALYTICS_DB_PATH pointing at the DuckDB file.
+DAYS = 3650
+COIN_ID = "bitcoin"
+
+MYSQL_QUERIES = {
+    "long range scan": ("""
+        SELECT id, timestamp, usd, usd_market_cap, volume FROM hist
+        WHERE id = %s AND timestamp >= NOW() - INTERVAL %s DAY ORDER BY timestamp ASC
+    """, (COIN_ID, DAYS)),
+    "monthly rollup": ("""
+        SELECT DATE_FORMAT(timestamp, '%%Y-%%m-01') AS period, MAX(usd) AS high, MIN(usd) AS low,
+        AVG(usd) AS avg_price, AVG(volume) AS avg_volume
+        FROM hist WHERE id = %s AND timestamp >= NOW() - INTERVAL %s DAY GROUP BY period
+    """, (COIN_ID, DAYS)),
+    "cross-coin aggregate": ("""
+        SELECT id, MIN(usd), MAX(usd), AVG(usd), SUM(volume) FROM hist
+        WHERE timestamp >= NOW() - INTERVAL %s DAY GROUP BY id
+    """, (DAYS,)),
+}
+
+DUCKDB_QUERIES = {
+    "long range scan": lambda: analytics.get_historical_prices(COIN_ID, DAYS),
+    "monthly rollup": lambda: analytics.get_rollup(COIN_ID, DAYS, "month"),
+    "cross-coin aggregate": lambda: analytics.get_performance(DAYS, 10000),
+}
+
+
+def time_mysql(query, params, repeat=5):
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return (time.perf_counter() - start) / repeat, len(rows)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def time_duckdb(query, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = query()
+    return (time.perf_counter() - start) / repeat, len(rows)
+
+
+if __name__ == "__main__":
+    if not analytics.analytics_enabled():
+        raise SystemExit("Set ANALYTICS_DB_PATH and install duckdb to run this benchmark")
+    for name, (query, params) in MYSQL_QUERIES.items():
+        mysql_time, mysql_rows = time_mysql(query, params)
+        duckdb_time, duckdb_rows = time_duckdb(DUCKDB_QUERIES[name])
+        print(f"{name:>22}: mysql {mysql_time * 1000:8.2f}ms ({mysql_rows} rows), "
+              f"duckdb {duckdb_time * 1000:8.2f}ms ({duckdb_rows} rows)")
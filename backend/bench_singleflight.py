@@ -0,0 +1,44 @@
+import threading, time
+from singleflight import SingleFlight
+
+
+# Thundering herd: many clients ask for the same page while one query is slow.
+CLIENTS = 200
+QUERY_SECONDS = 0.05
+
+
+def run(use_single_flight):
+    single_flight = SingleFlight()
+    queries = 0
+    queries_lock = threading.Lock()
+    start_barrier = threading.Barrier(CLIENTS)
+
+    def slow_query():
+        nonlocal queries
+        with queries_lock:
+            queries += 1
+        time.sleep(QUERY_SECONDS)
+        return b'[{"id":"bitcoin"}]'
+
+    def client():
+        start_barrier.wait()
+        if use_single_flight:
+            single_flight.do(("coins/all", (("limit", 20), ("sort_key", "market_cap"))), slow_query)
+        else:
+            slow_query()
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return queries, elapsed, single_flight.stats()
+
+
+if __name__ == "__main__":
+    for use_single_flight in (False, True):
+        queries, elapsed, stats = run(use_single_flight)
+        label = "single-flight" if use_single_flight else "no coalescing"
+        print(f"{label}: {CLIENTS} requests, {queries} queries, {elapsed:.3f}s, stats={stats}")
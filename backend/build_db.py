@@ -2,34 +2,49 @@ import requests, os, json, mysql.connector, time
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 from pprint import pprint
+from snapshot import write_snapshot
+from db import get_db_connection
+from alerts import AlertIndex, queue_alert_notifications
+import analytics
+from fx import FX_CURRENCIES, usd_rates_from_exchange_rates, usd_rates_from_charts
+from tracing import span, record_rate, traced_job
 
 
 load_dotenv()
 COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWD = os.getenv("MYSQL_PASSWD")
-MYSQL_DB = os.getenv("MYSQL_DB")
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWD,
-        database=MYSQL_DB
-    )
+MARKET_SNAPSHOT_PATH = os.getenv("MARKET_SNAPSHOT_PATH")
+MAX_RETRIES = 3
 
-def retrieve_coins_id():
-    url = "https://api.coingecko.com/api/v3/coins/list"
+def get_coingecko_json(url, params=None):
     headers = {"x-cg-demo-api-key" : COINGECKO_API_KEY}
-    try: 
-        response = requests.get(url, headers=headers)
+    with span("http.get", url=url, params=params) as current:
+        # Rate limits and server errors are retried with exponential backoff
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.perf_counter()
+            response = requests.get(url, headers=headers, params=params)
+            current.set(
+                http_status=response.status_code,
+                http_latency_ms=round((time.perf_counter() - start) * 1000, 3),
+                http_bytes=len(response.content),
+                retries=attempt
+            )
+            if attempt == MAX_RETRIES or (response.status_code != 429 and response.status_code < 500):
+                break
+            time.sleep(2 ** attempt)
         response.raise_for_status()
+    
+    with span("parse", bytes=len(response.content)):
         return response.json()
+
+def retrieve_coins_id():
+    url = "https://api.coingecko.com/api/v3/coins/list"
+    try: 
+        return get_coingecko_json(url)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
         return []
 
+@traced_job
 def save_coins_id():
     
     result_coins_id = retrieve_coins_id()
@@ -47,8 +62,10 @@ def save_coins_id():
     values_list = [(coin.get("id"), coin.get("symbol"), coin.get("name")) for coin in result_coins_id]
 
     try:
-        cursor.executemany(sql, values_list)
-        conn.commit()
+        with span("db.write", table="coins", rows=len(values_list)) as current:
+            cursor.executemany(sql, values_list)
+            conn.commit()
+            current.set(rowcount=cursor.rowcount)
         print(f"{cursor.rowcount} record inserted.")
     except Exception as e:
         print(f"Error inserting data: {e}")
@@ -59,16 +76,14 @@ def save_coins_id():
     
 def retrieve_coins_data(page_num=1):
     url = "https://api.coingecko.com/api/v3/coins/markets"
-    headers = {"x-cg-demo-api-key" : COINGECKO_API_KEY}
     params = {"vs_currency": "usd", "order": "market_cap_desc", "precision": 3, "per_page": 250, "page": page_num}
     try:
-        response = requests.get(url, headers=headers, params=params)
-        return response.json()
+        return get_coingecko_json(url, params)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
         return []
 
-def save_coins_prices(data, download_imgs=False):
+def save_coins_prices(data, download_imgs=False, alert_index=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -82,14 +97,17 @@ def save_coins_prices(data, download_imgs=False):
     
     def download_image(url, filepath):
         if not os.path.exists(filepath):
-            try:
-                resp = requests.get(url)
-                resp.raise_for_status()
-                with open(filepath, "wb") as f:
-                    f.write(resp.content)
-                print(f"Saved {filepath}")
-            except Exception as e:
-                print(f"Failed to download {url}: {e}")
+            with span("http.get", url=url) as current:
+                try:
+                    resp = requests.get(url)
+                    resp.raise_for_status()
+                    with open(filepath, "wb") as f:
+                        f.write(resp.content)
+                    print(f"Saved {filepath}")
+                except Exception as e:
+                    current.status = "ERROR"
+                    current.set(error=repr(e))
+                    print(f"Failed to download {url}: {e}")
 
     cursor.execute("""
             CREATE TABLE IF NOT EXISTS prices (
@@ -117,53 +135,59 @@ def save_coins_prices(data, download_imgs=False):
             );
         """)
     
-    one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-    details_list = []
-    for coin in data:
-        coin_id = coin.get("id")
-        current_price = coin.get("current_price")
-        market_cap = coin.get("market_cap")
-        total_volume = coin.get("total_volume")
-        market_cap_rank = coin.get("market_cap_rank")
-        fully_diluted_valuation = coin.get("fully_diluted_valuation")
-        high_24h = coin.get("high_24h")
-        low_24h = coin.get("low_24h")
-        price_change_24h = coin.get("price_change_24h")
-        price_change_percentage_24h = coin.get("price_change_percentage_24h") or 0.0
-        market_cap_change_24h = coin.get("market_cap_change_24h")
-        market_cap_change_percentage_24h = coin.get("market_cap_change_percentage_24h") or 0.0
-        circulating_supply = coin.get("circulating_supply")
-        total_supply = coin.get("total_supply")
-        max_supply = coin.get("max_supply")
-        ath = coin.get("ath")
-        ath_date = parse_iso_datetime(coin.get("ath_date"))
-        atl = coin.get("atl")
-        atl_date = parse_iso_datetime(coin.get("atl_date"))
-        last_updated_at = parse_iso_datetime(coin.get("last_updated"))
-        url = coin.get("image")
+    with span("transform", input_rows=len(data)) as current:
+        one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+        details_list = []
+        # Downloaded after the span so network time is not counted as transform time
+        images = []
+        for coin in data:
+            coin_id = coin.get("id")
+            current_price = coin.get("current_price")
+            market_cap = coin.get("market_cap")
+            total_volume = coin.get("total_volume")
+            market_cap_rank = coin.get("market_cap_rank")
+            fully_diluted_valuation = coin.get("fully_diluted_valuation")
+            high_24h = coin.get("high_24h")
+            low_24h = coin.get("low_24h")
+            price_change_24h = coin.get("price_change_24h")
+            price_change_percentage_24h = coin.get("price_change_percentage_24h") or 0.0
+            market_cap_change_24h = coin.get("market_cap_change_24h")
+            market_cap_change_percentage_24h = coin.get("market_cap_change_percentage_24h") or 0.0
+            circulating_supply = coin.get("circulating_supply")
+            total_supply = coin.get("total_supply")
+            max_supply = coin.get("max_supply")
+            ath = coin.get("ath")
+            ath_date = parse_iso_datetime(coin.get("ath_date"))
+            atl = coin.get("atl")
+            atl_date = parse_iso_datetime(coin.get("atl_date"))
+            last_updated_at = parse_iso_datetime(coin.get("last_updated"))
+            url = coin.get("image")
         
-        if not current_price or not market_cap or not last_updated_at:
-            continue
+            if not current_price or not market_cap or not last_updated_at:
+                continue
         
-        cleaned_timestamp = datetime.strptime(last_updated_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-        if cleaned_timestamp < one_hour_ago:
-            continue
-
-        filename = f"{coin_id}.png"
-        filepath = os.path.join(SAVE_DIR, filename)
-        relative_path = f"{SAVE_DIR}/{filename}"
-        if url and download_imgs:
-            download_image(url, filepath)
+            cleaned_timestamp = datetime.strptime(last_updated_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            if cleaned_timestamp < one_hour_ago:
+                continue
+
+            filename = f"{coin_id}.png"
+            filepath = os.path.join(SAVE_DIR, filename)
+            relative_path = f"{SAVE_DIR}/{filename}"
+            if url and download_imgs:
+                images.append((url, filepath))
             
-        details_list.append((
-        coin_id, current_price, market_cap, market_cap_rank,
-        fully_diluted_valuation, total_volume, high_24h, low_24h,
-        price_change_24h, price_change_percentage_24h,
-        market_cap_change_24h, market_cap_change_percentage_24h,
-        circulating_supply, total_supply, max_supply,
-        ath, ath_date, atl, atl_date, last_updated_at, relative_path
-        ))
+            details_list.append((
+            coin_id, current_price, market_cap, market_cap_rank,
+            fully_diluted_valuation, total_volume, high_24h, low_24h,
+            price_change_24h, price_change_percentage_24h,
+            market_cap_change_24h, market_cap_change_percentage_24h,
+            circulating_supply, total_supply, max_supply,
+            ath, ath_date, atl, atl_date, last_updated_at, relative_path
+            ))
+        record_rate(current, len(details_list))
 
+    for url, filepath in images:
+        download_image(url, filepath)
 
     if details_list:
         sql = """
@@ -199,39 +223,110 @@ def save_coins_prices(data, download_imgs=False):
         """
 
         try:
-            cursor.executemany(sql, details_list)
-            conn.commit()
-            print(f"{cursor.rowcount} record inserted.")
+            old_values = fetch_alert_values(cursor, [details[0] for details in details_list]) if alert_index else {}
+            triggered = []
+            with span("db.write", table="prices", rows=len(details_list)) as current:
+                cursor.executemany(sql, details_list)
+                rowcount = cursor.rowcount
+                # Queued in the same transaction, so a crossing is never lost between the two writes
+                if alert_index:
+                    for details in details_list:
+                        new_values = {"current_price": details[1], "price_change_percentage_24h": details[9]}
+                        triggered += alert_index.evaluate_coin(details[0], old_values.get(details[0], {}), new_values)
+                    queue_alert_notifications(cursor, [alert_id for alert_id, _, _ in triggered])
+                conn.commit()
+                current.set(rowcount=rowcount)
+            print(f"{rowcount} record inserted.")
+            if alert_index:
+                alert_index.discard(triggered)
         except Exception as e:
+            conn.rollback()
             print(f"Error inserting data: {e}")
         finally:
             cursor.close()
             conn.close()
     
+def fetch_alert_values(cursor, coin_ids):
+    if not coin_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(coin_ids))
+    cursor.execute(f"SELECT id, current_price, price_change_percentage_24h FROM prices WHERE id IN ({placeholders})", coin_ids)
+    return {
+        coin_id: {"current_price": current_price, "price_change_percentage_24h": change_24h}
+        for coin_id, current_price, change_24h in cursor.fetchall()
+    }
+
+
+def load_alert_index():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT alert_id, coin_id, kind, threshold FROM alerts WHERE active = TRUE")
+        alert_index = AlertIndex.from_alerts(cursor.fetchall())
+        print(f"Loaded {alert_index.size} active alerts.")
+        return alert_index
+    except Exception as e:
+        print(f"Error loading alerts: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@traced_job
 def batch_retrieve_save_coins_prices(max_pages = 4):
+    save_fx_rates(retrieve_fx_rates())
+    alert_index = load_alert_index()
     for page in range(1, max_pages + 1):
         data = retrieve_coins_data(page)
-        save_coins_prices(data, download_imgs=False)
+        save_coins_prices(data, download_imgs=False, alert_index=alert_index)
+    save_market_snapshot()
+
+
+def save_market_snapshot():
+    if not MARKET_SNAPSHOT_PATH:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    query = """
+        SELECT c.id, c.symbol, c.name, p.current_price, p.market_cap, p.market_cap_rank, p.fully_diluted_valuation, p.total_volume,
+        p.high_24h, p.low_24h, p.price_change_24h, p.price_change_percentage_24h, p.market_cap_change_24h, p.market_cap_change_percentage_24h,
+        p.circulating_supply, p.total_supply, p.max_supply, p.ath, p.ath_date, p.atl, p.atl_date
+        FROM coins c
+        JOIN prices p ON c.id = p.id;
+    """
+    try:
+        cursor.execute(query)
+        with span("snapshot.write", path=MARKET_SNAPSHOT_PATH):
+            count = write_snapshot(MARKET_SNAPSHOT_PATH, cursor.fetchall())
+        print(f"Wrote market snapshot with {count} coins to {MARKET_SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"Error writing market snapshot: {e}")
+    finally:
+        cursor.close()
+        conn.close()
         
 
-def retrieve_historical_prices(coin_id):   
+def retrieve_historical_prices(coin_id, vs_currency="usd", days=365):   
     url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
-    headers = {"x-cg-demo-api-key" : COINGECKO_API_KEY}
-    params = {"vs_currency": "usd", "days": 365, "interval": "daily"}
+    params = {"vs_currency": vs_currency, "days": days, "interval": "daily"}
     try:
-        response = requests.get(url, headers=headers, params=params)
-        return response.json()
+        return get_coingecko_json(url, params)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
         return []
     
 
 def save_historical_prices(coin_id, hist_data):
-    cleaned_data = []
-    for price, market_cap, volume in zip(hist_data["prices"], hist_data["market_caps"], hist_data["total_volumes"]):
-        timestamp_ms = price[0]
-        timestamp = datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc)
-        cleaned_data.append((coin_id, timestamp, price[1], market_cap[1], volume[1]))
+    with span("transform", coin_id=coin_id) as current:
+        cleaned_data = []
+        for price, market_cap, volume in zip(hist_data["prices"], hist_data["market_caps"], hist_data["total_volumes"]):
+            timestamp_ms = price[0]
+            timestamp = datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc)
+            cleaned_data.append((coin_id, timestamp, price[1], market_cap[1], volume[1]))
+        record_rate(current, len(cleaned_data))
         
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -254,17 +349,117 @@ def save_historical_prices(coin_id, hist_data):
         """
 
     try:
-        cursor.executemany(sql, cleaned_data)
-        conn.commit()
+        with span("db.write", table="hist", rows=len(cleaned_data)) as current:
+            cursor.executemany(sql, cleaned_data)
+            conn.commit()
+            current.set(rowcount=cursor.rowcount)
         print(f"{cursor.rowcount} record inserted.")
     except Exception as e:
         print(f"Error inserting data: {e}")
     finally:
         cursor.close()
         conn.close()
+    
+    if analytics.analytics_enabled():
+        try:
+            with span("analytics.write", table="hist", rows=len(cleaned_data)):
+                analytics.save_hist(cleaned_data)
+            print(f"{len(cleaned_data)} record written to analytics store.")
+        except Exception as e:
+            print(f"Error writing analytics store, sync_analytics_store will backfill it: {e}")
         
 
+def retrieve_fx_rates():
+    url = "https://api.coingecko.com/api/v3/exchange_rates"
+    try:
+        return usd_rates_from_exchange_rates(get_coingecko_json(url))
+    except requests.RequestException as e:
+        print(f"Error fetching data: {e}")
+        return {}
+
+
+def save_fx_rates(rates):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fx_rates (
+            currency VARCHAR(10) PRIMARY KEY,
+            rate DECIMAL(24,10) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+    """)
+    
+    sql = """
+        INSERT INTO fx_rates (currency, rate) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE rate = VALUES(rate)
+    """
+
+    try:
+        with span("db.write", table="fx_rates", rows=len(rates)) as current:
+            cursor.executemany(sql, list(rates.items()))
+            conn.commit()
+            current.set(rowcount=cursor.rowcount)
+        print(f"{cursor.rowcount} record inserted.")
+    except Exception as e:
+        print(f"Error inserting data: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def retrieve_fx_history(days=365):
+    # Bitcoin's daily chart in USD and in each currency yields the historical cross rates
+    usd_chart = retrieve_historical_prices("bitcoin", days=days)
+    history = {}
+    for currency in FX_CURRENCIES:
+        time.sleep(2)
+        currency_chart = retrieve_historical_prices("bitcoin", vs_currency=currency, days=days)
+        if isinstance(usd_chart, dict) and isinstance(currency_chart, dict):
+            history[currency] = usd_rates_from_charts(usd_chart, currency_chart)
+    return history
+
+
+def save_fx_history(history):
+    cleaned_data = [
+        (currency, timestamp, rate)
+        for currency, entries in history.items()
+        for timestamp, rate in entries
+    ]
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fx_hist (
+            currency VARCHAR(10) NOT NULL,
+            timestamp DATETIME NOT NULL,
+            rate DECIMAL(24,10) NOT NULL,
+            PRIMARY KEY (currency, timestamp)
+            )
+    """)
+    
+    sql = """
+        INSERT INTO fx_hist (currency, timestamp, rate) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE rate = VALUES(rate)
+    """
+
+    try:
+        with span("db.write", table="fx_hist", rows=len(cleaned_data)) as current:
+            cursor.executemany(sql, cleaned_data)
+            conn.commit()
+            current.set(rowcount=cursor.rowcount)
+        print(f"{cursor.rowcount} record inserted.")
+    except Exception as e:
+        print(f"Error inserting data: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@traced_job
 def batch_retrieve_save_hist_prices():
+    save_fx_history(retrieve_fx_history())
     response = retrieve_coins_data()
     top_marketcap_coins = []
     for coin in response:
@@ -274,7 +469,40 @@ def batch_retrieve_save_hist_prices():
         hist_data = retrieve_historical_prices(coin_id)
         save_historical_prices(coin_id, hist_data)
         time.sleep(2)
+    sync_analytics_store("hist")
+
+
+def sync_analytics_store(table):
+    if not analytics.analytics_enabled():
+        return
     
+    key, columns = analytics.TABLES[table]
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        with span("analytics.sync", table=table) as current:
+            # Re-copy any coin whose rows differ from MySQL, which also backfills failed writes
+            # The checksum catches rows that were updated in place, which leave the count and max timestamp alone
+            checksum_column, _ = analytics.CHECKSUM_COLUMNS[table]
+            cursor.execute(f"SELECT {key}, MAX(timestamp), COUNT(*), SUM({checksum_column}) FROM {table} GROUP BY {key}")
+            mysql_coverage = {
+                coin_id: (max_timestamp, count, checksum)
+                for coin_id, max_timestamp, count, checksum in cursor.fetchall()
+            }
+            store_coverage = analytics.coverage(table)
+            stale = [coin_id for coin_id, entry in mysql_coverage.items() if store_coverage.get(coin_id) != entry]
+            
+            for coin_id in stale:
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {key} = %s", (coin_id,))
+                analytics.replace_coin_rows(table, coin_id, cursor.fetchall())
+            analytics.publish()
+            current.set(backfilled_coins=len(stale))
+        print(f"Published analytics store, {len(stale)} coins backfilled.")
+    except Exception as e:
+        print(f"Error syncing analytics store: {e}")
+    finally:
+        cursor.close()
+        conn.close()
 
 
 def create_users_table():
@@ -309,6 +537,7 @@ def create_portfolio_table():
             user_id INT NOT NULL,
             coin_id VARCHAR(255) NOT NULL,
             amount DECIMAL(18,8) NOT NULL,
+            cost_basis DECIMAL(24,8) NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
             UNIQUE (user_id, coin_id)
@@ -324,24 +553,118 @@ def create_portfolio_table():
         conn.close()
 
 
+def create_portfolio_ledger_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio_transactions (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            coin_id VARCHAR(255) NOT NULL,
+            op ENUM('add', 'sell', 'set') NOT NULL,
+            amount DECIMAL(18,8) NOT NULL,
+            delta DECIMAL(18,8) NOT NULL,
+            price DECIMAL(24,8) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            INDEX (user_id, coin_id)
+            )
+    """)
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio_totals (
+            user_id INT PRIMARY KEY,
+            holdings INT NOT NULL DEFAULT 0,
+            cost_basis DECIMAL(24,8) NOT NULL DEFAULT 0,
+            realized_pnl DECIMAL(24,8) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+            )
+    """)
+    try:
+        # Portfolios created before the ledger have no cost basis yet
+        cursor.execute("SHOW COLUMNS FROM portfolio LIKE 'cost_basis'")
+        if not cursor.fetchall():
+            cursor.execute("ALTER TABLE portfolio ADD COLUMN cost_basis DECIMAL(24,8) NOT NULL DEFAULT 0 AFTER amount")
+        cursor.execute("SHOW COLUMNS FROM portfolio_transactions LIKE 'delta'")
+        if not cursor.fetchall():
+            cursor.execute("ALTER TABLE portfolio_transactions ADD COLUMN delta DECIMAL(18,8) NOT NULL DEFAULT 0 AFTER amount")
+        cursor.execute("""
+            INSERT IGNORE INTO portfolio_totals (user_id, holdings, cost_basis)
+            SELECT user_id, COUNT(*), SUM(cost_basis) FROM portfolio GROUP BY user_id
+        """)
+        conn.commit()
+        print("Created portfolio ledger tables")
+    except Exception as e:
+        print(f"Error creating table: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def create_alerts_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+            alert_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            coin_id VARCHAR(255) NOT NULL,
+            kind ENUM('price_above', 'price_below', 'change_above', 'change_below') NOT NULL,
+            threshold DECIMAL(22,8) NOT NULL,
+            active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            triggered_at DATETIME NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            INDEX (active, coin_id),
+            INDEX (user_id)
+            )
+    """)
+    cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alert_notifications (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            alert_id INT NOT NULL,
+            user_id INT NOT NULL,
+            coin_id VARCHAR(255) NOT NULL,
+            kind VARCHAR(32) NOT NULL,
+            threshold DECIMAL(22,8) NOT NULL,
+            current_price DECIMAL(16,3),
+            price_change_percentage_24h DECIMAL(16,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivered_at DATETIME NULL,
+            FOREIGN KEY (alert_id) REFERENCES alerts(alert_id) ON DELETE CASCADE,
+            INDEX (user_id, delivered_at)
+            )
+    """)
+    try:
+        conn.commit()
+        print("Created alerts tables")
+    except Exception as e:
+        print(f"Error creating table: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def retrieve_ohlc(coin_id, days):   
     url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/ohlc"
-    headers = {"x-cg-demo-api-key" : COINGECKO_API_KEY}
     params = {"vs_currency": "usd", "days": days}
     try:
-        response = requests.get(url, headers=headers, params=params)
-        return response.json()
+        return get_coingecko_json(url, params)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
         return []
     
 
 def save_ohlc(coin_id, ohlc_data):
-    cleaned_data = []
-    for entry in ohlc_data:
-        timestamp_ms = entry[0]
-        timestamp = datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc)
-        cleaned_data.append((coin_id, timestamp, entry[1], entry[2], entry[3], entry[4])) # append ..., open, high, low, close
+    with span("transform", coin_id=coin_id) as current:
+        cleaned_data = []
+        for entry in ohlc_data:
+            timestamp_ms = entry[0]
+            timestamp = datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc)
+            cleaned_data.append((coin_id, timestamp, entry[1], entry[2], entry[3], entry[4])) # append ..., open, high, low, close
+        record_rate(current, len(cleaned_data))
         
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -369,16 +692,27 @@ def save_ohlc(coin_id, ohlc_data):
     """
 
     try:
-        cursor.executemany(sql, cleaned_data)
-        conn.commit()
+        with span("db.write", table="ohlc", rows=len(cleaned_data)) as current:
+            cursor.executemany(sql, cleaned_data)
+            conn.commit()
+            current.set(rowcount=cursor.rowcount)
         print(f"{cursor.rowcount} record inserted.")
     except Exception as e:
         print(f"Error inserting data: {e}")
     finally:
         cursor.close()
         conn.close()
+    
+    if analytics.analytics_enabled():
+        try:
+            with span("analytics.write", table="ohlc", rows=len(cleaned_data)):
+                analytics.save_ohlc(cleaned_data)
+            print(f"{len(cleaned_data)} record written to analytics store.")
+        except Exception as e:
+            print(f"Error writing analytics store, sync_analytics_store will backfill it: {e}")
         
 
+@traced_job
 def batch_retrieve_save_ohlc():
     response = retrieve_coins_data()
     top_marketcap_coins = []
@@ -389,12 +723,15 @@ def batch_retrieve_save_ohlc():
         ohlc_data = retrieve_ohlc(coin_id, days=30)
         save_ohlc(coin_id, ohlc_data)
         time.sleep(2)
+    sync_analytics_store("ohlc")
 
 
 
 #save_coins_id()
 #create_users_table()
 #create_portfolio_table()
+#create_portfolio_ledger_tables()
+#create_alerts_tables()
 #batch_retrieve_save_coins_prices()
 #batch_retrieve_save_hist_prices()
 #batch_retrieve_save_ohlc()
\ No newline at end of file
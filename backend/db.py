@@ -0,0 +1,97 @@
+from dotenv import load_dotenv
+from auth import create_write_token, verify_write_token
+import os, threading, time, mysql.connector
+
+
+load_dotenv()
+MYSQL_HOST = os.getenv("MYSQL_HOST")
+MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
+MYSQL_USER = os.getenv("MYSQL_USER")
+MYSQL_PASSWD = os.getenv("MYSQL_PASSWD")
+MYSQL_DB = os.getenv("MYSQL_DB")
+# Comma separated list of read replicas, e.g. "127.0.0.1:3307,127.0.0.1:3308"
+MYSQL_REPLICA_HOSTS = os.getenv("MYSQL_REPLICA_HOSTS", "")
+# How long a replica is skipped after a failed connection attempt
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# How long a user's own reads stay on the primary after they wrote
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+
+def parse_hosts(hosts):
+    endpoints = []
+    for entry in hosts.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(":")
+        endpoints.append((host, int(port) if port else MYSQL_PORT))
+    return endpoints
+
+
+REPLICAS = parse_hosts(MYSQL_REPLICA_HOSTS)
+
+_lock = threading.Lock()
+_next_replica = 0
+_replica_down_until = {}
+
+
+def _connect(host, port):
+    return mysql.connector.connect(
+        host=host,
+        port=port,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWD,
+        database=MYSQL_DB
+    )
+
+
+def get_db_connection():
+    """Connection to the primary; use for all writes."""
+    return _connect(MYSQL_HOST, MYSQL_PORT)
+
+
+def issue_write_token(user_id):
+    # The client carries this back after a write, so any worker can see the pin
+    return create_write_token(user_id, READ_YOUR_WRITES_SECONDS)
+
+
+def get_read_connection(user_id=None, write_token=None):
+    """Connection to the next healthy replica, or the primary if none is reachable.
+
+    Reads carrying a valid write token for user_id (issued within
+    READ_YOUR_WRITES_SECONDS of a write) go to the primary.
+    """
+    global _next_replica
+    if not REPLICAS or (user_id is not None and write_token and verify_write_token(write_token, user_id)):
+        return get_db_connection()
+
+    with _lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % len(REPLICAS)
+
+    now = time.monotonic()
+    for i in range(len(REPLICAS)):
+        replica = REPLICAS[(start + i) % len(REPLICAS)]
+        if _replica_down_until.get(replica, 0) > now:
+            continue
+        try:
+            conn = _connect(*replica)
+        except mysql.connector.Error as e:
+            print(f"Replica {replica[0]}:{replica[1]} unavailable: {e}")
+            with _lock:
+                _replica_down_until[replica] = now + REPLICA_RETRY_SECONDS
+            continue
+        with _lock:
+            _replica_down_until.pop(replica, None)
+        return conn
+
+    return get_db_connection()
+
+
+def replica_status():
+    now = time.monotonic()
+    with _lock:
+        return [
+            {"host": host, "port": port, "healthy": _replica_down_until.get((host, port), 0) <= now}
+            for host, port in REPLICAS
+        ]
@@ -0,0 +1,156 @@
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Literal
+from fastapi import HTTPException
+from db import get_read_connection
+import os, threading, time, mysql.connector
+
+
+# Everything is stored in USD; other currencies are converted at read time.
+VsCurrency = Literal["usd", "eur", "gbp", "jpy"]
+FX_CURRENCIES = ("eur", "gbp", "jpy")
+FX_CACHE_SECONDS = float(os.getenv("FX_CACHE_SECONDS", "60"))
+
+_lock = threading.Lock()
+_rates = {"loaded_at": None, "rates": {}}
+_history = {}
+NO_SUCH_TABLE = 1146
+
+
+def _load_rates():
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT currency, rate FROM fx_rates")
+        return {currency: float(rate) for currency, rate in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _load_history(currency):
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT timestamp, rate FROM fx_hist WHERE currency = %s ORDER BY timestamp ASC", (currency,))
+        rows = cursor.fetchall()
+        return [timestamp for timestamp, _ in rows], [float(rate) for _, rate in rows]
+    except mysql.connector.ProgrammingError as err:
+        # fx_hist only exists once the historical job has run; use the current rate until then
+        if err.errno == NO_SUCH_TABLE:
+            return [], []
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_fx_rate(currency):
+    """USD -> currency rate from the fx_rates table, reloaded every FX_CACHE_SECONDS."""
+    if currency == "usd":
+        return 1.0
+    with _lock:
+        loaded_at = _rates["loaded_at"]
+        rates = _rates["rates"]
+    
+    # Reload outside the lock so a slow query doesn't block other requests
+    if loaded_at is None or time.monotonic() - loaded_at > FX_CACHE_SECONDS:
+        try:
+            rates = _load_rates()
+        except mysql.connector.Error as err:
+            raise HTTPException(status_code=500, detail=str(err))
+        with _lock:
+            _rates["rates"] = rates
+            _rates["loaded_at"] = time.monotonic()
+    
+    rate = rates.get(currency)
+    if rate is None:
+        raise HTTPException(status_code=503, detail=f"No exchange rate available for {currency}")
+    return rate
+
+
+def get_fx_history(currency):
+    with _lock:
+        cached = _history.get(currency)
+    
+    if cached is None or time.monotonic() - cached[0] > FX_CACHE_SECONDS:
+        try:
+            cached = (time.monotonic(), *_load_history(currency))
+        except mysql.connector.Error as err:
+            raise HTTPException(status_code=500, detail=str(err))
+        with _lock:
+            _history[currency] = cached
+    return cached[1], cached[2]
+
+
+def _scale(value, rate):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return round(value * rate)
+    return float(value) * rate
+
+
+def convert_rows(rows, fields, currency):
+    """Multiply the money columns of every row by the current USD -> currency rate.
+
+    Converted rows keep their column names (e.g. hist's usd) and gain a vs_currency field naming the currency they hold.
+    """
+    if currency == "usd" or not rows:
+        return rows
+    rate = get_fx_rate(currency)
+    for field in fields:
+        column = [_scale(row[field], rate) for row in rows]
+        for row, value in zip(rows, column):
+            row[field] = value
+    for row in rows:
+        row["vs_currency"] = currency
+    return rows
+
+
+def convert_series(rows, fields, currency, timestamp_field="timestamp"):
+    """Like convert_rows, but each row uses the FX rate in effect at its timestamp.
+
+    Rows older than the stored history, or any row when there is no history yet, use the current rate.
+    """
+    if currency == "usd" or not rows:
+        return rows
+    timestamps, history = get_fx_history(currency)
+    current = get_fx_rate(currency)
+
+    rates = []
+    for row in rows:
+        i = bisect_right(timestamps, row[timestamp_field])
+        rates.append(history[i - 1] if i else current)
+    for field in fields:
+        column = [_scale(row[field], rate) for row, rate in zip(rows, rates)]
+        for row, value in zip(rows, column):
+            row[field] = value
+    for row in rows:
+        row["vs_currency"] = currency
+    return rows
+
+
+def usd_rates_from_exchange_rates(exchange_rates):
+    # CoinGecko quotes every currency against BTC; rebase them on USD
+    rates = exchange_rates.get("rates", {})
+    usd = rates.get("usd", {}).get("value")
+    if not usd:
+        return {}
+    return {
+        currency: rates[currency]["value"] / usd
+        for currency in FX_CURRENCIES
+        if currency in rates
+    }
+
+
+def usd_rates_from_charts(usd_chart, currency_chart):
+    # Same asset priced in USD and in the other currency gives the daily cross rate
+    usd_prices = {timestamp_ms: price for timestamp_ms, price in usd_chart.get("prices", [])}
+    history = []
+    for timestamp_ms, price in currency_chart.get("prices", []):
+        usd_price = usd_prices.get(timestamp_ms)
+        if usd_price:
+            timestamp = datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc)
+            history.append((timestamp, price / usd_price))
+    return history
@@ -1,24 +1,30 @@
-from fastapi import FastAPI, HTTPException, Query, Depends, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Depends, HTTPException, Cookie, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from typing import Literal
 from auth import hash_password, verify_password, create_access_token
+from snapshot import load_market_snapshot
+from singleflight import SingleFlight
+from db import get_db_connection, get_read_connection, issue_write_token, replica_status, READ_YOUR_WRITES_SECONDS
+import analytics
+from portfolio import apply_operations, PortfolioError
+from alerts import condition_met, queue_alert_notifications
+from fx import VsCurrency, convert_rows, convert_series, FX_CACHE_SECONDS
 from jose import jwt, JWTError
 from pydantic import BaseModel, Field, EmailStr, condecimal
 from typing import Annotated
 from decimal import Decimal
-import os, mysql.connector
+import os, json, time, mysql.connector
 
 
 load_dotenv()
 COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWD = os.getenv("MYSQL_PASSWD")
-MYSQL_DB = os.getenv("MYSQL_DB")
 SECRET_KEY = os.getenv("SECRET_KEY")
+MARKET_SNAPSHOT_PATH = os.getenv("MARKET_SNAPSHOT_PATH")
 
     
 class UserRegistration(BaseModel):
@@ -32,16 +38,54 @@ class UserRegistration(BaseModel):
         Field(min_length=8)
     ]
     
-def get_db_connection():
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWD,
-        database=MYSQL_DB
-    )
+COIN_PRICE_FIELDS = (
+    "current_price", "market_cap", "fully_diluted_valuation", "total_volume", "high_24h", "low_24h",
+    "price_change_24h", "market_cap_change_24h", "ath", "atl"
+)
+COIN_LIST_PRICE_FIELDS = ("current_price", "market_cap")
+HIST_PRICE_FIELDS = ("usd", "usd_market_cap", "volume")
+OHLC_PRICE_FIELDS = ("open", "high", "low", "close")
+PORTFOLIO_PRICE_FIELDS = ("current_price", "market_cap", "high_24h", "low_24h", "price_change_24h", "cost_basis")
+PORTFOLIO_SUMMARY_PRICE_FIELDS = ("cost_basis", "realized_pnl")
+
+single_flight = SingleFlight()
+converted_cache = {}
+CONVERTED_CACHE_SIZE = 1024
+
+def coalesced_json_response(route, params, fetch, cache=False):
+    # Identical concurrent reads share one query and one serialized body
+    key = (route, tuple(sorted(params.items())))
+    if cache:
+        cached = converted_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return Response(content=cached[1], media_type="application/json")
+    
+    body = single_flight.do(key, lambda: json.dumps(
+        jsonable_encoder(fetch()), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8"))
+    
+    if cache:
+        if len(converted_cache) >= CONVERTED_CACHE_SIZE:
+            converted_cache.pop(next(iter(converted_cache)), None)
+        converted_cache[key] = (time.monotonic() + FX_CACHE_SECONDS, body)
+    return Response(content=body, media_type="application/json")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+READ_AFTER_WRITE_COOKIE = "read_after_write"
+
+def pin_reads_to_primary(response: Response, user_id: int):
+    # Sent back as a cookie or X-Read-After-Write header on the user's next reads
+    write_token = issue_write_token(user_id)
+    response.set_cookie(READ_AFTER_WRITE_COOKIE, write_token, max_age=int(READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax")
+    response.headers["X-Read-After-Write"] = write_token
+
+def read_after_write_token(
+    read_after_write: str | None = Cookie(None),
+    x_read_after_write: str | None = Header(None)
+):
+    return x_read_after_write or read_after_write
+
 app = FastAPI(title="CryptoAPI", version="1.0")
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +93,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Read-After-Write"],
 )
 
 icons_dir = os.path.join(os.getcwd(), "coin_icons")
@@ -136,11 +181,22 @@ def read_users_me(token: str = Depends(oauth2_scheme)):
     
 
 
+@app.get("/api/v1/metrics")
+def get_metrics():
+    return {"singleflight": single_flight.stats(), "replicas": replica_status()}
+
+
 @app.get("/api/v1/coin/{coin_id}")
-def get_coin_price(coin_id: str):
+def get_coin_price(coin_id: str, vs_currency: VsCurrency = Query("usd")):
+    snapshot = load_market_snapshot(MARKET_SNAPSHOT_PATH)
+    if snapshot:
+        result = snapshot.get_coin(coin_id)
+        if not result:
+            raise HTTPException(status_code=404, detail="Coin not found")
+        return convert_rows([result], COIN_PRICE_FIELDS, vs_currency)[0]
     
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -160,7 +216,7 @@ def get_coin_price(coin_id: str):
         if not result:
             raise HTTPException(status_code=404, detail="Coin not found")
 
-        return result
+        return convert_rows([result], COIN_PRICE_FIELDS, vs_currency)[0]
     
     except mysql.connector.Error as err:
         raise HTTPException(500, detail=str(err))
@@ -171,10 +227,28 @@ def get_coins_by_market_cap(
     limit: int = Query(20, gt=0, le=100),
     offset: int = Query(0, ge=0, le=10000),
     sort_key: Literal["id", "name", "current_price", "market_cap", "price_change_percentage_24h", "circulating_supply"] = Query("market_cap"),
-    sort_order: Literal["asc", "desc"] = Query("desc")
+    sort_order: Literal["asc", "desc"] = Query("desc"),
+    vs_currency: VsCurrency = Query("usd")
     ):
+    snapshot = load_market_snapshot(MARKET_SNAPSHOT_PATH)
+    if snapshot:
+        result = snapshot.list_coins(sort_key, sort_order, limit, offset)
+        if not result:
+            raise HTTPException(status_code=404, detail="No coins found")
+        return convert_rows(result, COIN_LIST_PRICE_FIELDS, vs_currency)
+    
+    params = {"limit": limit, "offset": offset, "sort_key": sort_key, "sort_order": sort_order}
+    return coalesced_json_response(
+        "coins/all",
+        {**params, "vs_currency": vs_currency},
+        lambda: convert_rows(fetch_coins_by_market_cap(**params), COIN_LIST_PRICE_FIELDS, vs_currency),
+        cache=vs_currency != "usd"
+    )
+
+
+def fetch_coins_by_market_cap(limit, offset, sort_key, sort_order):
     try: 
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         SORT_COLUMNS = {
@@ -214,9 +288,15 @@ def get_coins_by_market_cap(
 def get_coin_search(
     coin: str, 
     limit: int = Query(20, gt=0, le=100)):
+    snapshot = load_market_snapshot(MARKET_SNAPSHOT_PATH)
+    if snapshot:
+        result = snapshot.search(coin, limit)
+        if not result:
+            raise HTTPException(status_code=404, detail="No coins found")
+        return result
     
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -227,7 +307,9 @@ def get_coin_search(
             ORDER BY p.market_cap DESC
             LIMIT %s;
         """
-        search_term = f"%{coin}%"
+        # Match the search text literally, like the snapshot path does
+        escaped = coin.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        search_term = f"%{escaped}%"
         cursor.execute(query, (search_term, search_term, search_term, limit))
         result = cursor.fetchall()
 
@@ -247,7 +329,7 @@ def get_coin_search(
 def get_coins_summary():
     
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -275,10 +357,25 @@ def get_coins_summary():
 @app.get("/api/v1/coins/{coin_id}/historical")
 def get_historical_prices(
     coin_id: str, 
-    days: int = Query(7, gt=0, le=1000)
+    days: int = Query(7, gt=0, le=1000),
+    vs_currency: VsCurrency = Query("usd")
 ):
+    params = {"coin_id": coin_id, "days": days}
+    return coalesced_json_response(
+        "coins/historical",
+        {**params, "vs_currency": vs_currency},
+        lambda: convert_series(fetch_historical_prices(**params), HIST_PRICE_FIELDS, vs_currency),
+        cache=vs_currency != "usd"
+    )
+
+
+def fetch_historical_prices(coin_id, days):
+    result = analytics.try_read(analytics.get_historical_prices, coin_id, days)
+    if result:
+        return result
+    
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -306,10 +403,25 @@ def get_historical_prices(
 @app.get("/api/v1/coins/{coin_id}/ohlc")
 def get_ohlc(
     coin_id: str, 
-    days: int = Query(7, gt=0, le=100)
+    days: int = Query(7, gt=0, le=100),
+    vs_currency: VsCurrency = Query("usd")
 ):
+    params = {"coin_id": coin_id, "days": days}
+    return coalesced_json_response(
+        "coins/ohlc",
+        {**params, "vs_currency": vs_currency},
+        lambda: convert_series(fetch_ohlc(**params), OHLC_PRICE_FIELDS, vs_currency),
+        cache=vs_currency != "usd"
+    )
+
+
+def fetch_ohlc(coin_id, days):
+    result = analytics.try_read(analytics.get_ohlc, coin_id, days)
+    if result:
+        return result
+    
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -335,13 +447,89 @@ def get_ohlc(
         raise HTTPException(500, detail=str(err))
     
     
+@app.get("/api/v1/coins/{coin_id}/rollup")
+def get_rollup(
+    coin_id: str,
+    days: int = Query(365, gt=0, le=3650),
+    interval: Literal["day", "week", "month"] = Query("month")
+):
+    params = {"coin_id": coin_id, "days": days, "interval": interval}
+    return coalesced_json_response("coins/rollup", params, lambda: fetch_rollup(**params))
+
+
+def fetch_rollup(coin_id, days, interval):
+    result = analytics.try_read(analytics.get_rollup, coin_id, days, interval)
+    if result:
+        return result
+    
+    # Without the analytics store, bucket the MySQL rows in Python
+    return analytics.rollup_rows(fetch_historical_prices(coin_id, days), interval)
+
+
+@app.get("/api/v1/coins/performance")
+def get_performance(
+    days: int = Query(30, gt=0, le=3650),
+    limit: int = Query(20, gt=0, le=250)
+):
+    params = {"days": days, "limit": limit}
+    return coalesced_json_response("coins/performance", params, lambda: fetch_performance(**params))
+
+
+def fetch_performance(days, limit):
+    result = analytics.try_read(analytics.get_performance, days, limit)
+    if result:
+        return result
+    
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        query = """
+            SELECT r.id, f.usd AS start_price, l.usd AS end_price,
+            (l.usd / f.usd - 1) * 100 AS change_percentage
+            FROM (
+                SELECT id, MIN(timestamp) AS first_ts, MAX(timestamp) AS last_ts
+                FROM hist
+                WHERE timestamp >= NOW() - INTERVAL %s DAY
+                GROUP BY id
+            ) r
+            JOIN hist f ON f.id = r.id AND f.timestamp = r.first_ts
+            JOIN hist l ON l.id = r.id AND l.timestamp = r.last_ts
+            ORDER BY change_percentage DESC
+            LIMIT %s;
+        """
+        cursor.execute(query, (days, limit))
+        result = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        if not result:
+            raise HTTPException(status_code=404, detail="No data found")
+
+        return result
+    
+    except mysql.connector.Error as err:
+        raise HTTPException(500, detail=str(err))
+    
+    
 class PortfolioAdd(BaseModel):
     coin_id: str = Field(..., min_length=1)
     amount: Decimal = Field(gt=0, max_digits=18, decimal_places=8)
 
+class PortfolioOperation(BaseModel):
+    op: Literal["add", "sell", "set"]
+    coin_id: str = Field(..., min_length=1)
+    amount: Decimal = Field(ge=0, max_digits=18, decimal_places=8)
+    price: Decimal | None = Field(None, ge=0, max_digits=24, decimal_places=8)
+
+class PortfolioBatch(BaseModel):
+    operations: list[PortfolioOperation] = Field(..., min_length=1, max_length=1000)
+
 @app.post("/api/v1/portfolio/add")
 def add_portfolio(
     request: PortfolioAdd,
+    response: Response,
     token: str = Depends(oauth2_scheme)
 ):
     conn = None
@@ -353,19 +541,21 @@ def add_portfolio(
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        query = """
-            INSERT INTO portfolio (user_id, coin_id, amount)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE amount = amount + VALUES(amount);
-        """
-        cursor.execute(query, (user_id, request.coin_id, request.amount))
+        operation = PortfolioOperation(op="add", coin_id=request.coin_id, amount=request.amount)
+        apply_operations(cursor, user_id, [operation])
         conn.commit()
+        pin_reads_to_primary(response, user_id)
 
         cursor.close()
         conn.close()
         
         return {"msg": "Added to portfolio"}
 
+    except PortfolioError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
@@ -377,15 +567,89 @@ def add_portfolio(
         if conn:
             conn.close()
             
+@app.post("/api/v1/portfolio/batch")
+def batch_portfolio(
+    request: PortfolioBatch,
+    response: Response,
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # All operations land in one transaction or none do
+        applied = apply_operations(cursor, user_id, request.operations)
+        conn.commit()
+        pin_reads_to_primary(response, user_id)
+        
+        return {"msg": "Portfolio updated", "applied": applied}
+
+    except PortfolioError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.get("/api/v1/portfolio/summary")
+def get_portfolio_summary(
+    vs_currency: VsCurrency = Query("usd"),
+    write_token: str | None = Depends(read_after_write_token),
+    token: str = Depends(oauth2_scheme)
+):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_read_connection(user_id, write_token)
+        cursor = conn.cursor(dictionary=True)
+
+        query = """
+            SELECT holdings, cost_basis, realized_pnl, updated_at
+            FROM portfolio_totals
+            WHERE user_id = %s;
+        """
+        cursor.execute(query, (user_id,))
+        result = cursor.fetchone()
+
+        cursor.close()
+        conn.close()
+
+        if not result:
+            raise HTTPException(status_code=404, detail="No data found")
+
+        return convert_rows([result], PORTFOLIO_SUMMARY_PRICE_FIELDS, vs_currency)[0]
+    
+    except mysql.connector.Error as err:
+        raise HTTPException(500, detail=str(err))
+
+
 @app.get("/api/v1/portfolio/get")
 def get_portfolio(
+    vs_currency: VsCurrency = Query("usd"),
+    write_token: str | None = Depends(read_after_write_token),
     token: str = Depends(oauth2_scheme)
 ):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
         user_id: int = payload.get("user_id")
         
-        conn = get_db_connection()
+        conn = get_read_connection(user_id, write_token)
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -393,6 +657,7 @@ def get_portfolio(
             portfolio.id,
             portfolio.coin_id,
             portfolio.amount,
+            portfolio.cost_basis,
             portfolio.created_at,
             prices.current_price,
             prices.market_cap,
@@ -417,8 +682,240 @@ def get_portfolio(
         if not result:
             raise HTTPException(status_code=404, detail="No data found")
 
-        return result
+        return convert_rows(result, PORTFOLIO_PRICE_FIELDS, vs_currency)
+    
+    except mysql.connector.Error as err:
+        raise HTTPException(500, detail=str(err))
+        
+
+class AlertCreate(BaseModel):
+    coin_id: str = Field(..., min_length=1)
+    kind: Literal["price_above", "price_below", "change_above", "change_below"]
+    threshold: Decimal = Field(max_digits=22, decimal_places=8)
+
+def trigger_alert_if_met(cursor, alert_id, alert):
+    # Ingestion only fires on a crossing, so a condition that already holds fires right away
+    cursor.execute("SELECT current_price, price_change_percentage_24h FROM prices WHERE id = %s", (alert.coin_id,))
+    values = cursor.fetchone()
+    if values and condition_met(alert.kind, alert.threshold, values):
+        queue_alert_notifications(cursor, [alert_id])
+        return True
+    return False
+
+@app.post("/api/v1/alerts")
+def create_alert(
+    request: AlertCreate,
+    response: Response,
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        query = """
+            INSERT INTO alerts (user_id, coin_id, kind, threshold)
+            VALUES (%s, %s, %s, %s);
+        """
+        cursor.execute(query, (user_id, request.coin_id, request.kind, request.threshold))
+        alert_id = cursor.lastrowid
+        triggered = trigger_alert_if_met(cursor, alert_id, request)
+        conn.commit()
+        pin_reads_to_primary(response, user_id)
+        
+        return {"msg": "Alert created", "alert_id": alert_id, "triggered": triggered}
+
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.get("/api/v1/alerts")
+def get_alerts(
+    write_token: str | None = Depends(read_after_write_token),
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_read_connection(user_id, write_token)
+        cursor = conn.cursor(dictionary=True)
+
+        query = """
+            SELECT alert_id, coin_id, kind, threshold, active, created_at, triggered_at
+            FROM alerts
+            WHERE user_id = %s
+            ORDER BY created_at DESC;
+        """
+        cursor.execute(query, (user_id,))
+        return cursor.fetchall()
+
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     except mysql.connector.Error as err:
         raise HTTPException(500, detail=str(err))
-    
\ No newline at end of file
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.put("/api/v1/alerts/{alert_id}")
+def update_alert(
+    alert_id: int,
+    request: AlertCreate,
+    response: Response,
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # rowcount only counts changed rows, so an unchanged PUT would look like a missing alert
+        cursor.execute("SELECT alert_id FROM alerts WHERE alert_id = %s AND user_id = %s FOR UPDATE;", (alert_id, user_id))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail="Alert not found")
+
+        # Updating an alert re-arms it
+        query = """
+            UPDATE alerts
+            SET coin_id = %s, kind = %s, threshold = %s, active = TRUE, triggered_at = NULL
+            WHERE alert_id = %s AND user_id = %s;
+        """
+        cursor.execute(query, (request.coin_id, request.kind, request.threshold, alert_id, user_id))
+        
+        triggered = trigger_alert_if_met(cursor, alert_id, request)
+        conn.commit()
+        pin_reads_to_primary(response, user_id)
+        
+        return {"msg": "Alert updated", "triggered": triggered}
+
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.delete("/api/v1/alerts/{alert_id}")
+def delete_alert(
+    alert_id: int,
+    response: Response,
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute("DELETE FROM alerts WHERE alert_id = %s AND user_id = %s;", (alert_id, user_id))
+        conn.commit()
+        
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Alert not found")
+        pin_reads_to_primary(response, user_id)
+        
+        return {"msg": "Alert deleted"}
+
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.post("/api/v1/alerts/notifications/pull")
+def pull_alert_notifications(
+    limit: int = Query(50, gt=0, le=500),
+    token: str = Depends(oauth2_scheme)
+):
+    conn = None
+    cursor = None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id: int = payload.get("user_id")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # Pulling marks notifications delivered, so each one is handed out once
+        query = """
+            SELECT id, alert_id, coin_id, kind, threshold, current_price, price_change_percentage_24h, created_at
+            FROM alert_notifications
+            WHERE user_id = %s AND delivered_at IS NULL
+            ORDER BY id ASC
+            LIMIT %s
+            FOR UPDATE;
+        """
+        cursor.execute(query, (user_id, limit))
+        result = cursor.fetchall()
+        
+        if result:
+            placeholders = ", ".join(["%s"] * len(result))
+            cursor.execute(
+                f"UPDATE alert_notifications SET delivered_at = NOW() WHERE id IN ({placeholders})",
+                [row["id"] for row in result]
+            )
+        conn.commit()
+        
+        return result
+
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
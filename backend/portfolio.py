@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+
+# Matches the DECIMAL(24,8) columns, so running totals equal the sum of stored rows
+EIGHT_PLACES = Decimal("0.00000001")
+
+
+class PortfolioError(ValueError):
+    pass
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def apply_operations(cursor, user_id, operations):
+    """Apply add/sell/set operations for one user inside the caller's transaction.
+
+    Holdings keep an average cost basis, every operation is appended to
+    portfolio_transactions and portfolio_totals is adjusted by the net change,
+    so reads never have to replay the ledger. Returns the number of ledger rows.
+    """
+    coin_ids = sorted({operation.coin_id for operation in operations})
+
+    cursor.execute(
+        f"SELECT coin_id, amount, cost_basis FROM portfolio WHERE user_id = %s AND coin_id IN ({_placeholders(coin_ids)}) FOR UPDATE",
+        [user_id, *coin_ids]
+    )
+    before = {row["coin_id"]: (row["amount"], row["cost_basis"]) for row in cursor.fetchall()}
+
+    cursor.execute(f"SELECT id, current_price FROM prices WHERE id IN ({_placeholders(coin_ids)})", coin_ids)
+    prices = {row["id"]: row["current_price"] for row in cursor.fetchall()}
+
+    holdings = dict(before)
+    ledger = []
+    realized_pnl = Decimal(0)
+    for operation in operations:
+        coin_id = operation.coin_id
+        amount, cost_basis = holdings.get(coin_id, (Decimal(0), Decimal(0)))
+        if operation.op == "set":
+            delta = operation.amount - amount
+        elif operation.amount <= 0:
+            raise PortfolioError(f"Amount must be positive to {operation.op} {coin_id}")
+        elif operation.op == "add":
+            delta = operation.amount
+        else:
+            delta = -operation.amount
+
+        # A price is only needed when the holding actually changes
+        price = operation.price if operation.price is not None else prices.get(coin_id)
+        if price is None and delta != 0:
+            raise PortfolioError(f"No price available for {coin_id}")
+
+        if delta > 0:
+            cost_basis = (cost_basis + delta * price).quantize(EIGHT_PLACES)
+        elif delta < 0:
+            if -delta > amount:
+                raise PortfolioError(f"Cannot sell more {coin_id} than held")
+            sold_cost = (cost_basis * -delta / amount).quantize(EIGHT_PLACES)
+            cost_basis -= sold_cost
+            realized_pnl += (-delta * price).quantize(EIGHT_PLACES) - sold_cost
+        amount += delta
+
+        holdings[coin_id] = (amount, cost_basis)
+        ledger.append((user_id, coin_id, operation.op, operation.amount, delta, price or 0))
+
+    upserts = [(user_id, coin_id, amount, cost_basis) for coin_id, (amount, cost_basis) in holdings.items() if amount > 0]
+    emptied = [coin_id for coin_id, (amount, _) in holdings.items() if amount == 0 and coin_id in before]
+
+    if upserts:
+        cursor.execute(
+            f"""
+            INSERT INTO portfolio (user_id, coin_id, amount, cost_basis)
+            VALUES {", ".join(["(%s, %s, %s, %s)"] * len(upserts))}
+            ON DUPLICATE KEY UPDATE amount = VALUES(amount), cost_basis = VALUES(cost_basis)
+            """,
+            [value for row in upserts for value in row]
+        )
+    if emptied:
+        cursor.execute(
+            f"DELETE FROM portfolio WHERE user_id = %s AND coin_id IN ({_placeholders(emptied)})",
+            [user_id, *emptied]
+        )
+
+    cursor.executemany("""
+        INSERT INTO portfolio_transactions (user_id, coin_id, op, amount, delta, price)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, ledger)
+
+    holdings_delta = (
+        sum(1 for amount, _ in holdings.values() if amount > 0)
+        - sum(1 for amount, _ in before.values() if amount > 0)
+    )
+    cost_basis_delta = (
+        sum(cost_basis for amount, cost_basis in holdings.values() if amount > 0)
+        - sum(cost_basis for _, cost_basis in before.values())
+    )
+    cursor.execute("""
+        INSERT INTO portfolio_totals (user_id, holdings, cost_basis, realized_pnl)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        holdings = holdings + VALUES(holdings),
+        cost_basis = cost_basis + VALUES(cost_basis),
+        realized_pnl = realized_pnl + VALUES(realized_pnl)
+    """, (user_id, holdings_delta, cost_basis_delta, realized_pnl))
+
+    return len(ledger)
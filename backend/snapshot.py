@@ -0,0 +1,264 @@
+from array import array
+from datetime import datetime, timezone
+import math, mmap, os, struct, threading
+
+
+# Binary layout of a market snapshot file:
+#   header | string refs (uint32 offset/length per string column)
+#          | float columns (float64, NaN for NULL)
+#          | integer columns (int64, plus a bitmap with a set bit per NULL)
+#          | sort indexes (uint32 row numbers in ascending order per sort key)
+#          | string table (utf-8)
+# Every section starts on an 8 byte boundary so it can be cast in place.
+MAGIC = b"CGSNAP02"
+HEADER = struct.Struct("<8sIIQ")
+
+STRING_COLUMNS = ("id", "symbol", "name")
+NUMERIC_COLUMNS = (
+    "current_price", "market_cap", "market_cap_rank", "fully_diluted_valuation", "total_volume",
+    "high_24h", "low_24h", "price_change_24h", "price_change_percentage_24h",
+    "market_cap_change_24h", "market_cap_change_percentage_24h",
+    "circulating_supply", "total_supply", "max_supply", "ath", "ath_date", "atl", "atl_date"
+)
+# BIGINT columns can exceed 2**53, so they are kept as int64 rather than float64
+INTEGER_COLUMNS = tuple(column for column in NUMERIC_COLUMNS if column in {
+    "market_cap", "market_cap_rank", "fully_diluted_valuation", "total_volume",
+    "market_cap_change_24h", "circulating_supply", "total_supply", "max_supply"
+})
+FLOAT_COLUMNS = tuple(column for column in NUMERIC_COLUMNS if column not in INTEGER_COLUMNS)
+DATETIME_COLUMNS = {"ath_date", "atl_date"}
+SORT_KEYS = ("id", "name", "symbol", "current_price", "market_cap", "price_change_percentage_24h", "circulating_supply")
+
+COIN_FIELDS = STRING_COLUMNS + NUMERIC_COLUMNS
+LIST_FIELDS = ("id", "name", "symbol", "current_price", "market_cap", "price_change_percentage_24h", "circulating_supply")
+SEARCH_FIELDS = ("id", "symbol", "name")
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _bitmap_size(row_count):
+    return (row_count + 7) // 8
+
+
+def _layout(row_count):
+    sections = {}
+    offset = _align(HEADER.size)
+    for column in STRING_COLUMNS:
+        sections[f"{column}_offset"] = offset
+        offset = _align(offset + 4 * row_count)
+        sections[f"{column}_length"] = offset
+        offset = _align(offset + 4 * row_count)
+    for column in FLOAT_COLUMNS:
+        sections[column] = offset
+        offset = _align(offset + 8 * row_count)
+    for column in INTEGER_COLUMNS:
+        sections[column] = offset
+        offset = _align(offset + 8 * row_count)
+        sections[f"{column}_nulls"] = offset
+        offset = _align(offset + _bitmap_size(row_count))
+    for key in SORT_KEYS:
+        sections[f"sort_{key}"] = offset
+        offset = _align(offset + 4 * row_count)
+    sections["strings"] = offset
+    return sections
+
+
+def _to_float(value):
+    if value is None:
+        return math.nan
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def _sort_value(row, key):
+    value = row[key]
+    if key in STRING_COLUMNS:
+        return (0, (value or "").casefold() if key != "id" else value or "")
+    # NULLs sort first in ascending order, like MySQL
+    if value is None:
+        return (0, 0)
+    if key in INTEGER_COLUMNS:
+        return (1, int(value))
+    return (1, _to_float(value))
+
+
+def write_snapshot(path, rows):
+    rows = sorted(rows, key=lambda row: row["id"])
+    row_count = len(rows)
+    sections = _layout(row_count)
+
+    strings = bytearray()
+    string_refs = {}
+    for column in STRING_COLUMNS:
+        offsets, lengths = array("I"), array("I")
+        for row in rows:
+            encoded = (row[column] or "").encode("utf-8")
+            offsets.append(len(strings))
+            lengths.append(len(encoded))
+            strings += encoded
+        string_refs[column] = (offsets, lengths)
+
+    buf = bytearray(sections["strings"] + len(strings))
+    HEADER.pack_into(buf, 0, MAGIC, row_count, len(NUMERIC_COLUMNS), len(strings))
+    for column, (offsets, lengths) in string_refs.items():
+        buf[sections[f"{column}_offset"]:sections[f"{column}_offset"] + 4 * row_count] = offsets.tobytes()
+        buf[sections[f"{column}_length"]:sections[f"{column}_length"] + 4 * row_count] = lengths.tobytes()
+    for column in FLOAT_COLUMNS:
+        values = array("d", (_to_float(row[column]) for row in rows))
+        buf[sections[column]:sections[column] + 8 * row_count] = values.tobytes()
+    for column in INTEGER_COLUMNS:
+        values = array("q", (0 if row[column] is None else int(row[column]) for row in rows))
+        buf[sections[column]:sections[column] + 8 * row_count] = values.tobytes()
+        nulls = sections[f"{column}_nulls"]
+        for i, row in enumerate(rows):
+            if row[column] is None:
+                buf[nulls + i // 8] |= 1 << (i % 8)
+    for key in SORT_KEYS:
+        order = array("I", sorted(range(row_count), key=lambda i: _sort_value(rows[i], key)))
+        buf[sections[f"sort_{key}"]:sections[f"sort_{key}"] + 4 * row_count] = order.tobytes()
+    buf[sections["strings"]:] = strings
+
+    # Write next to the target and swap it in, so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buf)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return row_count
+
+
+class MarketSnapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.stat_key = _stat_key(os.fstat(f.fileno()))
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, row_count, numeric_count, strings_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or numeric_count != len(NUMERIC_COLUMNS):
+            raise ValueError(f"{path} is not a market snapshot")
+        self.row_count = row_count
+
+        view = memoryview(self._mm)
+        sections = _layout(row_count)
+        if len(self._mm) != sections["strings"] + strings_length:
+            raise ValueError(f"{path} is truncated")
+        self._string_refs = {
+            column: (
+                view[sections[f"{column}_offset"]:sections[f"{column}_offset"] + 4 * row_count].cast("I"),
+                view[sections[f"{column}_length"]:sections[f"{column}_length"] + 4 * row_count].cast("I"),
+            )
+            for column in STRING_COLUMNS
+        }
+        self._floats = {
+            column: view[sections[column]:sections[column] + 8 * row_count].cast("d")
+            for column in FLOAT_COLUMNS
+        }
+        self._integers = {
+            column: (
+                view[sections[column]:sections[column] + 8 * row_count].cast("q"),
+                view[sections[f"{column}_nulls"]:sections[f"{column}_nulls"] + _bitmap_size(row_count)],
+            )
+            for column in INTEGER_COLUMNS
+        }
+        self._sort = {
+            key: view[sections[f"sort_{key}"]:sections[f"sort_{key}"] + 4 * row_count].cast("I")
+            for key in SORT_KEYS
+        }
+        self._strings = view[sections["strings"]:sections["strings"] + strings_length]
+
+    def _value(self, column, row):
+        if column in self._string_refs:
+            offsets, lengths = self._string_refs[column]
+            start = offsets[row]
+            return str(self._strings[start:start + lengths[row]], "utf-8")
+
+        if column in self._integers:
+            values, nulls = self._integers[column]
+            if nulls[row // 8] & (1 << (row % 8)):
+                return None
+            return values[row]
+
+        value = self._floats[column][row]
+        if math.isnan(value):
+            return None
+        if column in DATETIME_COLUMNS:
+            return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+        return value
+
+    def _row(self, row, fields):
+        return {field: self._value(field, row) for field in fields}
+
+    def get_coin(self, coin_id):
+        # rows are written in id order, so binary search over the id column
+        low, high = 0, self.row_count
+        while low < high:
+            mid = (low + high) // 2
+            if self._value("id", mid) < coin_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.row_count and self._value("id", low) == coin_id:
+            return self._row(low, COIN_FIELDS)
+        return None
+
+    def list_coins(self, sort_key, sort_order, limit, offset):
+        order = self._sort[sort_key]
+        if sort_order == "desc":
+            start = self.row_count - 1 - offset
+            rows = range(start, max(start - limit, -1), -1)
+        else:
+            rows = range(offset, min(offset + limit, self.row_count))
+        return [self._row(order[i], LIST_FIELDS) for i in rows]
+
+    def search(self, term, limit):
+        term = term.casefold()
+        result = []
+        order = self._sort["market_cap"]
+        for i in range(self.row_count - 1, -1, -1):
+            row = order[i]
+            if any(term in self._value(column, row).casefold() for column in SEARCH_FIELDS):
+                result.append(self._row(row, SEARCH_FIELDS))
+                if len(result) >= limit:
+                    break
+        return result
+
+
+def _stat_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def load_market_snapshot(path):
+    """Return the mapped snapshot at path, remapping it when the file was swapped, or None if missing."""
+    if not path:
+        return None
+    try:
+        stat_key = _stat_key(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+    snapshot = _snapshots.get(path)
+    if snapshot is not None and snapshot.stat_key == stat_key:
+        return snapshot
+
+    with _snapshots_lock:
+        snapshot = _snapshots.get(path)
+        if snapshot is None or snapshot.stat_key != stat_key:
+            # An old format or corrupt file is skipped so callers fall back to MySQL
+            try:
+                snapshot = MarketSnapshot(path)
+            except (ValueError, struct.error) as e:
+                print(f"Ignoring market snapshot {path}: {e}")
+                _snapshots.pop(path, None)
+                return None
+            _snapshots[path] = snapshot
+    return snapshot
@@ -0,0 +1,73 @@
+from alerts import AlertIndex, condition_met
+
+
+def make_index():
+    return AlertIndex.from_alerts([
+        (1, "bitcoin", "price_above", 100),
+        (2, "bitcoin", "price_above", 110),
+        (3, "bitcoin", "price_above", 110),
+        (4, "bitcoin", "price_below", 90),
+        (5, "bitcoin", "price_below", 80),
+        (6, "bitcoin", "change_above", 5),
+    ])
+
+
+def test_up_kinds_fire_when_threshold_is_crossed_or_reached():
+    index = make_index()
+    # old < threshold <= new
+    assert index.evaluate("bitcoin", "price_above", 99, 100) == [1]
+    assert index.evaluate("bitcoin", "price_above", 100, 110) == [2, 3]
+    assert index.evaluate("bitcoin", "price_above", 100, 100) == []
+    assert index.evaluate("bitcoin", "price_above", 110, 120) == []
+    assert index.evaluate("bitcoin", "price_above", 120, 90) == []
+
+
+def test_down_kinds_fire_when_threshold_is_crossed_or_reached():
+    index = make_index()
+    # new <= threshold < old
+    assert index.evaluate("bitcoin", "price_below", 91, 90) == [4]
+    assert index.evaluate("bitcoin", "price_below", 90, 80) == [5]
+    assert index.evaluate("bitcoin", "price_below", 100, 70) == [5, 4]
+    assert index.evaluate("bitcoin", "price_below", 90, 90) == []
+    assert index.evaluate("bitcoin", "price_below", 70, 100) == []
+
+
+def test_missing_values_never_fire():
+    index = make_index()
+    assert index.evaluate("bitcoin", "price_above", None, 200) == []
+    assert index.evaluate("bitcoin", "price_above", 50, None) == []
+    assert index.evaluate("ethereum", "price_above", 50, 200) == []
+    assert index.evaluate_coin("bitcoin", {}, {"current_price": 200}) == []
+
+
+def test_evaluate_leaves_alerts_armed_until_discarded():
+    index = make_index()
+    triggered = index.evaluate_coin(
+        "bitcoin",
+        {"current_price": 95, "price_change_percentage_24h": 1},
+        {"current_price": 105, "price_change_percentage_24h": 6},
+    )
+    assert triggered == [(1, "bitcoin", "price_above"), (6, "bitcoin", "change_above")]
+    assert index.size == 6
+    assert index.evaluate("bitcoin", "price_above", 95, 105) == [1]
+
+    index.discard(triggered)
+    assert index.size == 4
+    assert index.evaluate("bitcoin", "price_above", 95, 200) == [2, 3]
+    assert index.evaluate("bitcoin", "change_above", 1, 6) == []
+
+
+def test_add_keeps_thresholds_sorted():
+    index = make_index()
+    index.add(7, "bitcoin", "price_above", 105)
+    assert index.evaluate("bitcoin", "price_above", 99, 106) == [1, 7]
+    assert index.size == 7
+
+
+def test_condition_met():
+    assert condition_met("price_above", 100, {"current_price": 100})
+    assert not condition_met("price_above", 100, {"current_price": 99})
+    assert condition_met("price_below", 100, {"current_price": 100})
+    assert not condition_met("price_below", 100, {"current_price": 101})
+    assert condition_met("change_below", -5, {"price_change_percentage_24h": -6})
+    assert not condition_met("price_above", 100, {"current_price": None})
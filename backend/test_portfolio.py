@@ -0,0 +1,122 @@
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from portfolio import apply_operations, PortfolioError
+
+
+class FakeCursor:
+    def __init__(self, holdings=None, prices=None):
+        self.holdings = holdings or {}
+        self.prices = prices or {}
+        self.executed = []
+        self.ledger = []
+        self._result = []
+
+    def execute(self, query, params=()):
+        self.executed.append((" ".join(query.split()), params))
+        if query.startswith("SELECT coin_id, amount, cost_basis FROM portfolio"):
+            self._result = [
+                {"coin_id": coin_id, "amount": amount, "cost_basis": cost_basis}
+                for coin_id, (amount, cost_basis) in self.holdings.items()
+            ]
+        elif query.startswith("SELECT id, current_price FROM prices"):
+            self._result = [{"id": coin_id, "current_price": price} for coin_id, price in self.prices.items()]
+
+    def executemany(self, query, rows):
+        self.ledger.extend(rows)
+
+    def fetchall(self):
+        return self._result
+
+    def statement(self, prefix):
+        return [params for query, params in self.executed if query.startswith(prefix)]
+
+    def totals(self):
+        _, holdings, cost_basis, realized_pnl = self.statement("INSERT INTO portfolio_totals")[0]
+        return holdings, cost_basis, realized_pnl
+
+
+def op(op, coin_id, amount, price=None):
+    return SimpleNamespace(op=op, coin_id=coin_id, amount=Decimal(amount), price=None if price is None else Decimal(price))
+
+
+def test_add_uses_current_price_for_cost_basis():
+    cursor = FakeCursor(prices={"bitcoin": Decimal("100")})
+
+    assert apply_operations(cursor, 1, [op("add", "bitcoin", "2")]) == 1
+
+    assert cursor.statement("INSERT INTO portfolio (")[0] == [1, "bitcoin", Decimal("2"), Decimal("200.00000000")]
+    assert cursor.totals() == (1, Decimal("200.00000000"), 0)
+
+
+def test_sell_releases_average_cost_and_realizes_pnl():
+    cursor = FakeCursor(holdings={"bitcoin": (Decimal("2"), Decimal("100"))}, prices={"bitcoin": Decimal("80")})
+
+    apply_operations(cursor, 1, [op("sell", "bitcoin", "1")])
+
+    assert cursor.statement("INSERT INTO portfolio (")[0] == [1, "bitcoin", Decimal("1"), Decimal("50.00000000")]
+    assert cursor.totals() == (0, Decimal("-50.00000000"), Decimal("30.00000000"))
+
+
+def test_ledger_records_requested_amount_and_signed_delta():
+    cursor = FakeCursor(holdings={"bitcoin": (Decimal("2"), Decimal("100"))}, prices={"bitcoin": Decimal("80")})
+
+    apply_operations(cursor, 1, [op("sell", "bitcoin", "0.5"), op("set", "bitcoin", "3")])
+
+    assert cursor.ledger == [
+        (1, "bitcoin", "sell", Decimal("0.5"), Decimal("-0.5"), Decimal("80")),
+        (1, "bitcoin", "set", Decimal("3"), Decimal("1.5"), Decimal("80")),
+    ]
+
+
+def test_selling_everything_deletes_the_holding():
+    cursor = FakeCursor(holdings={"bitcoin": (Decimal("2"), Decimal("100"))}, prices={"bitcoin": Decimal("80")})
+
+    apply_operations(cursor, 1, [op("set", "bitcoin", "0")])
+
+    assert cursor.statement("DELETE FROM portfolio")[0] == [1, "bitcoin"]
+    assert cursor.statement("INSERT INTO portfolio (") == []
+    assert cursor.totals() == (-1, Decimal("-100"), Decimal("60.00000000"))
+
+
+def test_oversell_rejects_the_whole_batch():
+    cursor = FakeCursor(holdings={"bitcoin": (Decimal("1"), Decimal("50"))}, prices={"bitcoin": Decimal("80"), "ethereum": Decimal("5")})
+
+    with pytest.raises(PortfolioError):
+        apply_operations(cursor, 1, [op("add", "ethereum", "1"), op("sell", "bitcoin", "2")])
+
+    assert cursor.statement("INSERT INTO portfolio") == []
+    assert cursor.ledger == []
+
+
+def test_non_positive_add_or_sell_is_rejected():
+    cursor = FakeCursor(prices={"bitcoin": Decimal("80")})
+
+    with pytest.raises(PortfolioError):
+        apply_operations(cursor, 1, [op("add", "bitcoin", "0")])
+
+
+def test_set_without_change_does_not_need_a_price():
+    cursor = FakeCursor(holdings={"delisted": (Decimal("1"), Decimal("10"))})
+
+    apply_operations(cursor, 1, [op("set", "delisted", "1")])
+
+    assert cursor.totals() == (0, Decimal("0"), 0)
+
+
+def test_missing_price_is_rejected_when_holding_changes():
+    cursor = FakeCursor()
+
+    with pytest.raises(PortfolioError):
+        apply_operations(cursor, 1, [op("add", "delisted", "1")])
+
+
+def test_totals_are_rounded_to_stored_precision():
+    cursor = FakeCursor(holdings={"bitcoin": (Decimal("3"), Decimal("100"))}, prices={"bitcoin": Decimal("50")})
+
+    apply_operations(cursor, 1, [op("sell", "bitcoin", "1")])
+
+    _, cost_basis, realized_pnl = cursor.totals()
+    assert cost_basis == Decimal("-33.33333333")
+    assert realized_pnl == Decimal("16.66666667")
+    assert -realized_pnl.as_tuple().exponent <= 8
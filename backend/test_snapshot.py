@@ -0,0 +1,81 @@
+from datetime import datetime
+from snapshot import COIN_FIELDS, MarketSnapshot, load_market_snapshot, write_snapshot
+
+
+def coin(coin_id, name, market_cap, current_price, **values):
+    row = dict.fromkeys(COIN_FIELDS)
+    row.update(id=coin_id, symbol=coin_id[:3], name=name, market_cap=market_cap, current_price=current_price)
+    row.update(values)
+    return row
+
+
+ROWS = [
+    coin("bitcoin", "Bitcoin", 2**53 + 1, 65000.5, total_supply=21000000, ath_date=datetime(2024, 3, 14, 7, 10, 36)),
+    coin("ethereum", "Ethereum", 9007199254740993123, 3200.25, max_supply=None),
+    coin("nullcoin", "100% Null_Coin", None, None),
+]
+
+
+def write(tmp_path, rows):
+    path = str(tmp_path / "market.snap")
+    assert write_snapshot(path, rows) == len(rows)
+    return path
+
+
+def test_round_trip_keeps_bigints_and_nulls(tmp_path):
+    snapshot = MarketSnapshot(write(tmp_path, ROWS))
+
+    bitcoin = snapshot.get_coin("bitcoin")
+    assert bitcoin["market_cap"] == 2**53 + 1
+    assert bitcoin["total_supply"] == 21000000
+    assert bitcoin["max_supply"] is None
+    assert bitcoin["current_price"] == 65000.5
+    assert bitcoin["ath_date"] == datetime(2024, 3, 14, 7, 10, 36)
+    assert snapshot.get_coin("ethereum")["market_cap"] == 9007199254740993123
+
+    nullcoin = snapshot.get_coin("nullcoin")
+    assert nullcoin["name"] == "100% Null_Coin"
+    assert nullcoin["market_cap"] is None and nullcoin["current_price"] is None
+    assert snapshot.get_coin("dogecoin") is None
+
+
+def test_list_coins_orders_and_pages(tmp_path):
+    snapshot = MarketSnapshot(write(tmp_path, ROWS))
+
+    # NULLs sort first ascending, like MySQL
+    assert [row["id"] for row in snapshot.list_coins("market_cap", "asc", 10, 0)] == ["nullcoin", "bitcoin", "ethereum"]
+    assert [row["id"] for row in snapshot.list_coins("market_cap", "desc", 2, 0)] == ["ethereum", "bitcoin"]
+    assert [row["id"] for row in snapshot.list_coins("market_cap", "desc", 10, 2)] == ["nullcoin"]
+    assert snapshot.list_coins("market_cap", "desc", 10, 5) == []
+    assert snapshot.list_coins("market_cap", "asc", 10, 5) == []
+
+
+def test_search_is_literal(tmp_path):
+    snapshot = MarketSnapshot(write(tmp_path, ROWS))
+
+    assert [row["id"] for row in snapshot.search("100%", 10)] == ["nullcoin"]
+    assert [row["id"] for row in snapshot.search("_", 10)] == ["nullcoin"]
+    assert [row["id"] for row in snapshot.search("ETH", 10)] == ["ethereum"]
+
+
+def test_empty_snapshot(tmp_path):
+    snapshot = MarketSnapshot(write(tmp_path, []))
+
+    assert snapshot.row_count == 0
+    assert snapshot.get_coin("bitcoin") is None
+    assert snapshot.list_coins("market_cap", "desc", 10, 0) == []
+    assert snapshot.search("bit", 10) == []
+
+
+def test_unreadable_snapshot_falls_back(tmp_path):
+    old_format = tmp_path / "old.snap"
+    old_format.write_bytes(b"CGSNAP01" + bytes(64))
+    truncated = tmp_path / "truncated.snap"
+    truncated.write_bytes(open(write(tmp_path, ROWS), "rb").read()[:100])
+    empty = tmp_path / "empty.snap"
+    empty.write_bytes(b"")
+
+    assert load_market_snapshot(str(old_format)) is None
+    assert load_market_snapshot(str(truncated)) is None
+    assert load_market_snapshot(str(empty)) is None
+    assert load_market_snapshot(str(tmp_path / "missing.snap")) is None
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+import functools, json, os, secrets, sys, time
+
+
+# Spans are written one JSON object per line using the OpenTelemetry span field
+# names, so they can be read as logs or forwarded to a collector as-is.
+load_dotenv()
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+# "cprofile" or "pyinstrument" to profile each ingestion job
+INGEST_PROFILE = os.getenv("INGEST_PROFILE")
+INGEST_PROFILE_DIR = os.getenv("INGEST_PROFILE_DIR", "profiles")
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.status = "OK"
+        self.start_time_unix_nano = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.start_time_unix_nano + int(self.duration * 1e9),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _export(span):
+    line = json.dumps(span.to_dict(), default=str)
+    if TRACE_LOG_PATH:
+        with open(TRACE_LOG_PATH, "a") as f:
+            f.write(line + "\n")
+    else:
+        print(line, file=sys.stderr)
+
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = "ERROR"
+        current.set(error=repr(e))
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current_span.reset(token)
+        _export(current)
+
+
+def record_rate(current, rows, key="rows_per_sec"):
+    # Call at the end of a span body; the span is still open so time so far is used
+    elapsed = time.perf_counter() - current._start
+    current.set(rows=rows, **{key: round(rows / elapsed, 1) if elapsed > 0 else None})
+
+
+@contextmanager
+def _profiled(name):
+    if INGEST_PROFILE == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(INGEST_PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(INGEST_PROFILE_DIR, f"{name}-{int(time.time())}.prof"))
+    elif INGEST_PROFILE == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            os.makedirs(INGEST_PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(INGEST_PROFILE_DIR, f"{name}-{int(time.time())}.html"), "w") as f:
+                f.write(profiler.output_html())
+    else:
+        yield
+
+
+def traced_job(func):
+    """Run an ingestion job under a root span, profiling it when INGEST_PROFILE is set."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(f"job.{func.__name__}"), _profiled(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
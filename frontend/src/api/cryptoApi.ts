@@ -4,6 +4,8 @@ const API_BASE_URL = "http://localhost:8000/api/v1";
 
 const api = axios.create({
   baseURL: API_BASE_URL,
+  // send the read-after-write cookie so reads right after a write hit the primary
+  withCredentials: true,
 });
 
 